@@ -1,5 +1,12 @@
 import os
 import argparse
+import csv
+import functools
+import hashlib
+import io
+import math
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 try:
     import parselmouth
@@ -9,12 +16,239 @@ try:
 except ImportError as e:
     print(f'{e}. Install the required dependencies. Try: <pip install -r requirements.txt>')
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+@functools.lru_cache(maxsize=None)
+def _formant_keys(n_formants: int) -> tuple:
+
+    """
+    Column names ('F1', ..., 'Fn') for a given formant count, built once per
+    count so every consumer shares the same string objects.
+    """
+
+    return tuple(f'F{i}' for i in range(1, n_formants + 1))
+
+
+def _ensure_mono(sound):
+
+    """
+    Return the sound as mono, skipping the channel mix (and the buffer copy
+    it implies) when the sound is already single-channel.
+    """
+
+    return sound if sound.n_channels == 1 else sound.convert_to_mono()
+
+
+def _sample_formants(tracks, times, t0, dt):
+
+    """
+    Sample each formant track at the given times via nearest-frame lookup.
+
+    A vectorized NumPy gather; when numba is installed it is replaced below
+    by an equivalent compiled scalar kernel with no temporary index array.
+    """
+
+    n_frames = tracks.shape[1]
+    frame_idx = np.clip(((times - t0) / dt + 0.5).astype(int), 0, n_frames - 1)
+    return tracks[:, frame_idx]
+
+
+if numba is not None:
+    def _sample_formants_kernel(tracks, times, t0, dt):
+        n_tracks, n_frames = tracks.shape
+        out = np.empty((n_tracks, times.shape[0]))
+        for j in range(times.shape[0]):
+            frame = int((times[j] - t0) / dt + 0.5)
+            if frame < 0:
+                frame = 0
+            elif frame >= n_frames:
+                frame = n_frames - 1
+            for i in range(n_tracks):
+                out[i, j] = tracks[i, frame]
+        return out
+
+    try:
+        # Only swap the kernel in once it has actually compiled; any numba
+        # failure leaves the NumPy gather in place.
+        _compiled = numba.njit(fastmath=True, cache=True)(_sample_formants_kernel)
+        _compiled(np.zeros((1, 1)), np.zeros(1), 0.0, 1.0)
+        _sample_formants = _compiled
+    except Exception:
+        pass
+
+
+def _envelope(times, values, n_cols):
+
+    """
+    Decimate a waveform to a per-pixel-column min/max envelope.
+
+    The raster can never resolve more than n_cols columns, so plotting one
+    (min, max) pair per column draws the same picture as the full waveform
+    at a fraction of the line-segment count. Returns the waveform unchanged
+    when it is already short enough.
+    """
+
+    samples_per_col = values.shape[0] // n_cols
+    if samples_per_col < 2:
+        return times, values
+
+    n_used = n_cols * samples_per_col
+    chunks = values[:n_used].reshape(n_cols, samples_per_col)
+    col_times = times[:n_used].reshape(n_cols, samples_per_col)[:, 0]
+
+    # Interleave min and max so one polyline sweeps each column's extent.
+    env = np.column_stack([chunks.min(axis=1), chunks.max(axis=1)]).ravel()
+    return np.repeat(col_times, 2), env
+
+
+def _prefetch_wavs(paths):
+
+    """
+    Ask the kernel to start reading the given files into the page cache, so
+    the analysis pass finds them already resident instead of blocking on
+    disk. No-op on platforms without posix_fadvise.
+    """
+
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+@functools.lru_cache(maxsize=32)
+def _load_sound(path: str):
+
+    """
+    Read a sound file as a mono parselmouth.Sound.
+
+    Recently used files are cached, so workflows that touch the same file
+    from several methods (e.g. save_to_mono followed by get_formants) only
+    decode it from disk once.
+    """
+
+    return _ensure_mono(parselmouth.Sound(path))
+
+
+def _run_burg(path: str, n_formants: int) -> tuple:
+
+    """
+    Run the Burg formant analysis on a sound file.
+
+    Returns:
+    tuple: (tracks, t0, dt, duration) where tracks is an
+    (n_formants, n_frames) array of formant values in Hz.
+    """
+
+    sound = _load_sound(path)
+    dur = sound.get_total_duration()
+
+    formant = sound.to_formant_burg(max_number_of_formants=n_formants)
+
+    # Pull each formant track out of Praat in one 'To Matrix' call
+    # instead of one get_value_at_time() call per timestamp.
+    dt = parselmouth.praat.call(formant, 'Get time step')
+    t0 = parselmouth.praat.call(formant, 'Get time from frame number', 1)
+    tracks = np.stack([
+        parselmouth.praat.call(formant, 'To Matrix', i).values[0, :]
+        for i in range(1, n_formants + 1)
+    ])
+
+    # 'To Matrix' encodes undefined formants as 0.0; restore them to NaN
+    # (0 Hz is never a valid formant) so they stay missing downstream.
+    tracks[tracks == 0] = np.nan
+
+    return tracks, t0, dt, dur
+
+
+def _analyze_file(path: str, n_formants: int, cache_dir: str = None) -> tuple:
+
+    """
+    Run (or load from the disk cache) the Burg analysis for a single sound file.
+
+    Module-level so it can be dispatched to worker processes. Sampling at the
+    requested timestamps happens in the parent process, so the same analysis
+    can be resampled at any timestamp density.
+
+    Parameters:
+    path (str): Path to the .wav file to analyze.
+    n_formants (int): The number of formants to extract.
+    cache_dir (str): Directory for cached Burg analyses, or None to disable caching.
+
+    Returns:
+    tuple: (tracks, t0, dt, duration) where tracks is an
+    (n_formants, n_frames) array of formant values in Hz.
+    """
+
+    cache_path = None
+    if cache_dir is not None:
+        # Key the cache on file content, not path, so renamed or moved
+        # copies of the same audio still hit.
+        with open(path, 'rb') as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        cache_path = os.path.join(cache_dir, f'{digest}_{n_formants}.npz')
+
+    tracks = None
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            stored = np.load(cache_path)
+            tracks = stored['tracks']
+            # Entries written before undefined formants were mapped to NaN
+            # still hold the raw 0.0 encoding from 'To Matrix'.
+            tracks[tracks == 0] = np.nan
+            t0, dt, dur = (float(stored[k]) for k in ('t0', 'dt', 'duration'))
+            print(f'Analyzing {os.path.basename(path)}... (cached)')
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Truncated or otherwise corrupt entry (e.g. an interrupted
+            # earlier run): recompute and overwrite it below.
+            tracks = None
+
+    if tracks is None:
+        print(f'Analyzing {os.path.basename(path)}...')
+        tracks, t0, dt, dur = _run_burg(path, n_formants)
+        if cache_path is not None:
+            # Write-then-rename keeps the entry atomic, so an interrupted
+            # run (or two workers racing on identical content) can never
+            # leave a half-written .npz behind.
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, tracks=tracks, t0=t0, dt=dt, duration=dur)
+            os.replace(tmp_path, cache_path)
+
+    return tracks, t0, dt, dur
+
 
 class PraatSimplifier():
     
     def __init__(self, in_dir: str, out_dir: str):
         self.in_dir = in_dir
         self.out_dir = out_dir
+        self.cache_dir = os.path.join(out_dir or '.', '.formant_cache')
+        self._cols = {}
+        self._df = None
+        self._plot_tables = None
+        self._csv_streamed = False
+        self._formant_cache = {}
+
+
+    def _list_wavs(self) -> list:
+
+        """
+        List the .wav files in the input directory (case-insensitive extension).
+        """
+
+        with os.scandir(self.in_dir) as entries:
+            return sorted(e.path for e in entries if e.is_file() and e.name.lower().endswith('.wav'))
 
 
     def save_to_mono(self):
@@ -23,73 +257,168 @@ class PraatSimplifier():
         Convert all files to mono if necessary.
         """
 
-        for file in os.listdir(self.in_dir):
-            if file.endswith('.wav'):
-                sound = parselmouth.Sound(os.path.join(self.in_dir, file))
-                mono_signal = sound.convert_to_mono()
-                output_path = os.path.join(self.out_dir, file)
-                mono_signal.save(output_path, format='WAV')
-                print(f'Mono sound saved to {output_path}')
+        for path in self._list_wavs():
+            mono_signal = _load_sound(path)
+            output_path = os.path.join(self.out_dir, os.path.basename(path))
+            mono_signal.save(output_path, format='WAV')
+            print(f'Mono sound saved to {output_path}')
         print('Done.')
 
 
-    def get_formants(self, n_timestamps: int = 10, n_formants: int = 3) -> list:
-        
+    def get_formants(self, n_timestamps: int = 10, n_formants: int = 3, stream_to_csv: bool = False, max_workers: int = None) -> dict:
+
         """
         Extract formants from audio files in the specified directory.
 
         Parameters:
         n_timestamps (int): The number of timestamps to sample per file.
         n_formants (int): The number of formants to extract.
+        stream_to_csv (bool): Write formants.csv incrementally as each file is
+        analyzed, so export_formants() does not need a second full pass.
+        max_workers (int): Number of worker processes (default: the core
+        count). With max_workers=1 files are analyzed in this process, with
+        the next file's decode prefetched in a background thread.
 
         Returns:
-        list: A list of dictionaries containing formant data.
+        dict: A mapping from column name ('sound', 'time', 'F1', ...) to the
+        accumulated per-file arrays of formant data.
         """
-        
+
         self.n_timestamps = n_timestamps
         self.n_formants = n_formants
 
-        self.f_data = []
-        
-        for file in os.listdir(self.in_dir):
-            if file.endswith('.wav'):
-                print(f'Analyzing {file}...')
-
-                sound = parselmouth.Sound(os.path.join(self.in_dir, file))
-                sound = sound.convert_to_mono()
-                dur = sound.get_total_duration()
+        # Columnar (struct-of-arrays) accumulation: one array per column per
+        # file, concatenated once on export, instead of one dict per row.
+        f_cols = _formant_keys(self.n_formants)
+        self._cols = {key: [] for key in ('sound', 'time') + f_cols}
+        self._df = None
+        self._plot_tables = None
+        self._csv_streamed = False
+
+        wavs = self._list_wavs()
+        _prefetch_wavs(wavs)
+
+        stream = None
+        writer = None
+        if stream_to_csv:
+            self._csv_path = os.path.join(self.out_dir or '.', 'formants.csv')
+            stream = open(self._csv_path, 'w', newline='', buffering=1 << 20)
+            writer = csv.writer(stream)
+            writer.writerow(('sound', 'time') + f_cols)
+
+        # Each file's Burg analysis is an independent, CPU-bound Praat call, so
+        # spread the files over a process pool (processes rather than threads:
+        # parselmouth can hold the GIL during Praat calls). Analyses already
+        # memoized on the instance skip the pool entirely, so re-running with
+        # a different n_timestamps only resamples.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        analyze = functools.partial(_analyze_file, n_formants=self.n_formants, cache_dir=self.cache_dir)
+        missing = [path for path in wavs if (path, self.n_formants) not in self._formant_cache]
+        if missing and (max_workers is None or max_workers > 1):
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+                for path, result in zip(missing, executor.map(analyze, missing)):
+                    self._formant_cache[(path, self.n_formants)] = result
+        elif missing:
+            # Single-worker fallback: run the analyses themselves on a
+            # two-thread executor, so the next file's read (or its disk-cache
+            # load, which never needs the WAV decoded at all) overlaps the
+            # current file's Burg analysis instead of eagerly decoding every
+            # file whether or not its cache entry hits.
+            with ThreadPoolExecutor(max_workers=2) as prefetcher:
+                for path, result in zip(missing, prefetcher.map(analyze, missing)):
+                    self._formant_cache[(path, self.n_formants)] = result
 
+        try:
+            for path in wavs:
+                tracks, t0, dt, dur = self._formant_cache[(path, self.n_formants)]
+                name = os.path.splitext(os.path.basename(path))[0]
                 time_points = np.linspace(0, dur, self.n_timestamps)
+                sampled = _sample_formants(tracks, time_points, t0, dt)
+
+                self._cols['sound'].append(np.full(len(time_points), name, dtype=object))
+                self._cols['time'].append(time_points)
+                for i, key in enumerate(f_cols):
+                    # float32 is plenty for Hz values rounded to 3 decimals
+                    # and halves the size of the stored columns.
+                    self._cols[key].append(sampled[i].astype(np.float32))
+                if writer is not None:
+                    # Same cell formatting as export_formants: microsecond
+                    # times, 3-decimal formants, empty fields for NaN.
+                    writer.writerows(
+                        (name, f'{t:.6f}', *('' if math.isnan(v) else f'{v:.3f}' for v in row))
+                        for t, row in zip(time_points.tolist(), sampled.T.tolist())
+                    )
+        finally:
+            if stream is not None:
+                stream.close()
+
+        if stream_to_csv:
+            self._csv_streamed = True
+            print(f'File saved to {self._csv_path}')
+
+        return self._cols
+
+
+    def _to_dataframe(self) -> pd.DataFrame:
 
-                formant = sound.to_formant_burg(max_number_of_formants=self.n_formants)
+        """
+        Concatenate the accumulated columns into a DataFrame, cached on the instance.
+        """
 
-                for time in time_points:
-                    formant_data = {'sound': file[:-4], 'time': time}
-                    for i in range(1, self.n_formants + 1):
-                        formant_value = formant.get_value_at_time(i, time)
-                        formant_data[f'F{i}'] = round(formant_value, 3) if formant_value is not None else None
-                    self.f_data.append(formant_data)
-        
-        return self.f_data
+        if self._df is None:
+            df = pd.DataFrame({key: np.concatenate(arrs) for key, arrs in self._cols.items()})
+            # One interned label per file instead of one string per row.
+            df['sound'] = df['sound'].astype('category')
+            f_cols = list(_formant_keys(self.n_formants))
+            df[f_cols] = df[f_cols].round(3)
+            self._df = df
+        return self._df
     
 
-    def export_formants(self):
-        
+    def export_formants(self, format: str = 'csv'):
+
         """
-        Export the extracted formant data to a CSV file.
+        Export the extracted formant data to a CSV (or Parquet) file.
+
+        Parameters:
+        format (str): 'csv' (default) or 'parquet'. Parquet keeps the compact
+        float32 columns and compresses far better than CSV (requires pyarrow).
         """
-        
-        if not self.f_data:
+
+        if not self._cols or not self._cols['sound']:
             print("No formant data to export. Run get_formants() first.")
             return
-        
-        df = pd.DataFrame(self.f_data)
-        file_path = f'{self.out_dir}/formants.csv' if self.out_dir else 'formants.csv'
-        df.to_csv(file_path, index=False)
+
+        if self._csv_streamed and format == 'csv':
+            # Already written row by row during get_formants().
+            print(f'File saved to {self._csv_path}')
+            return
+
+        file_path = f'{self.out_dir}/formants.{format}' if self.out_dir else f'formants.{format}'
+        if format == 'parquet':
+            self._to_dataframe().to_parquet(file_path, compression='zstd')
+        else:
+            # np.savetxt formats each numeric block in a C loop without
+            # allocating a Python string per cell like DataFrame.to_csv.
+            # The constant sound name is folded into the row format string,
+            # one per-file block at a time.
+            f_cols = _formant_keys(self.n_formants)
+            with open(file_path, 'w', newline='') as f:
+                f.write(','.join(('sound', 'time') + f_cols) + '\n')
+                for i, names in enumerate(self._cols['sound']):
+                    block = np.column_stack([self._cols['time'][i]] + [self._cols[key][i] for key in f_cols])
+                    # Times keep microsecond precision (only the formants are
+                    # rounded); undefined formants become empty fields, as
+                    # to_csv wrote them. Only the '%.3f' fields can format as
+                    # 'nan', so the replace cannot touch names or times.
+                    row_fmt = str(names[0]).replace('%', '%%') + ',%.6f' + ',%.3f' * self.n_formants
+                    buffer = io.StringIO()
+                    np.savetxt(buffer, block, fmt=row_fmt)
+                    f.write(buffer.getvalue().replace(',nan', ','))
         print(f'File saved to {file_path}')
 
     
-    def plot_sound_amplitude(self, sound_dir: str, start_time: float = None, end_time: float = None, save_amplitude_plot: bool = False):
+    def plot_sound_amplitude(self, sound_dir: str, start_time: float = None, end_time: float = None, save_amplitude_plot: bool = False, dpi: int = 200):
 
         """
         Plots the sound amplitude of a sound file.
@@ -98,6 +427,8 @@ class PraatSimplifier():
             - sound_dir: directory to the selected sound
             - start_time: start at time x (float)
             - end_time: trim at time y (float)
+            - save_amplitude_plot: save the plot to out_dir
+            - dpi: resolution of the saved plot
 
         Returns: An amplitude plot of the sound.
         """
@@ -105,15 +436,18 @@ class PraatSimplifier():
         assert sound_dir.endswith('.wav'), 'plot_sound_amplitude() can only process one .wav sound file.'
 
         try:
-            sound = parselmouth.Sound(sound_dir)
+            sound = _load_sound(sound_dir)
             if start_time is not None and end_time is not None:
                 extracted_sound = sound.extract_part(from_time=start_time, to_time=end_time, preserve_times=True)
             else:
                 extracted_sound = sound
-            extracted_sound = extracted_sound.convert_to_mono()
+
+            # Down to one (min, max) pair per pixel column: the raster cannot
+            # resolve more, and full-rate audio submits millions of segments.
+            times, amplitudes = _envelope(extracted_sound.xs(), extracted_sound.values[0], n_cols=10 * dpi)
 
             plt.figure(figsize=(10, 5))
-            plt.plot(extracted_sound.xs(), extracted_sound.values[0], linewidth=0.3, color='rebeccapurple')
+            plt.plot(times, amplitudes, linewidth=0.3, color='rebeccapurple')
             plt.xlabel('Time (s)')
             plt.ylabel('Amplitude')
             plt.title('Sound Wave')
@@ -123,34 +457,55 @@ class PraatSimplifier():
                 assert self.out_dir, 'Specify --out_dir to save the plot.'
                 if not os.path.exists(self.out_dir):
                     os.makedirs(self.out_dir)
-                plt.savefig(os.path.join(self.out_dir, 'amplitude_plot.png'), dpi=1200)
+                plt.savefig(os.path.join(self.out_dir, 'amplitude_plot.png'), dpi=dpi)
             
             plt.show()
         except Exception as e:
             print(f'An error occurred: {e}')
 
 
-    def plot_formants(self, save_formant_plot: bool = False, dpi: int = 1200):
+    def plot_formants(self, save_formant_plot: bool = False, dpi: int = 200, format: str = 'png'):
 
         """
         Plot the extracted F-values by sound (maximum of 9 for clarity.)
+
+        Parameters:
+            - save_formant_plot: save the plot to out_dir
+            - dpi: resolution of the saved raster plot
+            - format: output format; 'pdf' gives vector output where dpi does not matter
         """
 
-        if not self.f_data:
+        if not self._cols or not self._cols['sound']:
             print('No formant data. Run get_formants() first.')
             return
 
-        unique_sounds = min(len(set(d['sound'] for d in self.f_data)), 9)
+        # Each file's rows are already contiguous per-sound arrays in the
+        # accumulated columns, so panels plot those blocks directly — no
+        # union-of-time-grids pivot, whose padding would be indistinguishable
+        # from genuinely undefined (NaN) samples that must break the line.
+        # Cached on the instance: re-plotting while tuning dpi or format
+        # should not rebuild the tables.
+        f_cols = _formant_keys(self.n_formants)
+        if self._plot_tables is None:
+            self._plot_tables = {
+                str(names[0]): (self._cols['time'][i], {key: self._cols[key][i] for key in f_cols})
+                for i, names in enumerate(self._cols['sound'])
+            }
+        sounds = sorted(self._plot_tables)
+
+        unique_sounds = min(len(sounds), 9)
         nrows = np.ceil(unique_sounds / 3).astype(int)
-        
-        fig, axs = plt.subplots(nrows, 3, figsize=(10, nrows * 3))
-        fig.tight_layout(pad=3)
+
+        # constrained_layout solves the layout during drawing; tight_layout
+        # would re-solve it again at save time.
+        fig, axs = plt.subplots(nrows, 3, figsize=(10, nrows * 3), constrained_layout=True)
 
         axs = axs.flatten()
 
-        for ax, (sound, df) in zip(axs, pd.DataFrame(self.f_data).groupby('sound')):
-            for i in range(1, self.n_formants + 1):
-                ax.plot(df['time'], df[f'F{i}'], label=f'F{i}')
+        for ax, sound in zip(axs, sounds):
+            times, tracks = self._plot_tables[sound]
+            for key in f_cols:
+                ax.plot(times, tracks[key], label=key)
             ax.set_title(sound, fontsize=10)
             ax.set_xlabel('Time (s)', fontsize=10)
             ax.set_ylabel('Frequency (Hz)', fontsize=10)
@@ -164,9 +519,9 @@ class PraatSimplifier():
         if save_formant_plot:
             if not os.path.exists(self.out_dir):
                 os.makedirs(self.out_dir)
-            file_path = os.path.join(self.out_dir, 'formant_plots.png')
+            file_path = os.path.join(self.out_dir, f'formant_plots.{format}')
             try:
-                plt.savefig(file_path, dpi=dpi)
+                plt.savefig(file_path, dpi=dpi, format=format)
                 print(f"Plot saved successfully to {file_path}")
             except Exception as e:
                 print(f"Failed to save the plot: {e}")
@@ -185,9 +540,13 @@ if __name__ == "__main__":
     parser.add_argument('--get_formants', type=bool, required=False, default=False, help='Analyze formants.')
     parser.add_argument('--n_timestamps', type=int, required=False, default=10, help='Number of timestamps to extract the formants from.')
     parser.add_argument('--n_formants', type=int, required=False, default=3, help='Number of formants to extract.')
+    parser.add_argument('--max_workers', type=int, required=False, default=None, help='Worker processes for analysis (1 = in-process with prefetch).')
     parser.add_argument('--export_formants_file', type=bool, required=False, default=False, help='Export .csv with formants.')
+    parser.add_argument('--stream_csv', type=bool, required=False, default=False, help='Write the .csv incrementally during analysis.')
+    parser.add_argument('--export_format', type=str, required=False, default='csv', help="Export format: 'csv' or 'parquet'.")
     parser.add_argument('--save_formant_plot', type=bool, required=False, default=False, help='True = save plot; False = do not save')
-    parser.add_argument('--dpi', type=int, required=False, default=300, help='Quality of plot.')
+    parser.add_argument('--dpi', type=int, required=False, default=200, help='Quality of plot.')
+    parser.add_argument('--plot_format', type=str, required=False, default='png', help="Plot file format ('pdf' for vector output).")
     """
     Args for audio transformantion
     """
@@ -206,13 +565,13 @@ if __name__ == "__main__":
     simplifier = PraatSimplifier(args.in_dir, args.out_dir)
 
     if args.get_formants:
-        formants = simplifier.get_formants(n_formants=args.n_formants, n_timestamps=args.n_timestamps)
+        formants = simplifier.get_formants(n_formants=args.n_formants, n_timestamps=args.n_timestamps, stream_to_csv=args.stream_csv, max_workers=args.max_workers)
 
     if args.export_formants_file:
-        simplifier.export_formants()
+        simplifier.export_formants(format=args.export_format)
 
     if args.save_formant_plot:
-        simplifier.plot_formants(save_formant_plot=True, dpi=args.dpi)
+        simplifier.plot_formants(save_formant_plot=True, dpi=args.dpi, format=args.plot_format)
 
     if args.save_to_mono:
         simplifier.save_to_mono()